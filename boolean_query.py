@@ -0,0 +1,328 @@
+"""
+Разбор и вычисление булевых запросов над списками doc_id.
+
+Список документов (Posting) — пара (вид, массив):
+- (DENSE, битсет np.uint64[nwords]) для частых термов;
+- (SPARSE, отсортированный массив int32) для редких.
+Для каждой пары видов операндов выбирается своё ядро: dense∧dense — побитовое
+AND, sparse∧dense — выборка битов по номерам, sparse∧sparse — слияние массивов.
+
+Модуль полностью аннотирован, чтобы его можно было скомпилировать mypyc:
+  mypyc boolean_query.py
+Рядом появится расширение boolean_query.*.so, и boolean_search.py будет
+импортировать его вместо исходника. Без компиляции всё работает как обычно.
+"""
+
+from __future__ import annotations
+
+import sys
+from typing import Optional, Protocol, Union
+
+import numpy as np
+
+# Операторы в запросе (регистронезависимо)
+AND_OP = "and"
+OR_OP = "or"
+NOT_OP = "not"
+
+# Приоритеты операторов для сортировочной станции: OR < AND < NOT
+PRECEDENCE: dict[str, int] = {OR_OP: 1, AND_OP: 2, NOT_OP: 3}
+# Пропущенный операнд в RPN; токенизатор пустых строк не выдаёт
+EMPTY_OPERAND = ""
+
+
+DENSE = "dense"
+SPARSE = "sparse"
+
+Posting = tuple[str, np.ndarray]
+
+EMPTY: Posting = (SPARSE, np.zeros(0, dtype=np.int32))
+
+
+class PostingIndex(Protocol):
+    """Индекс терм -> Posting: dict или TrieIndex из boolean_search.py."""
+
+    def get(self, term: str, /) -> Optional[Posting]: ...
+
+
+def bit_count(bits: np.ndarray) -> int:
+    """Количество документов в битсете."""
+    return int(np.unpackbits(bits.view(np.uint8)).sum())
+
+
+def posting_size(p: Posting) -> int:
+    """Количество документов в списке любого вида."""
+    return bit_count(p[1]) if p[0] == DENSE else int(p[1].size)
+
+
+def is_empty(p: Posting) -> bool:
+    return not p[1].any() if p[0] == DENSE else p[1].size == 0
+
+
+def to_dense(p: Posting, nwords: int) -> np.ndarray:
+    """Битсет из nwords слов для списка любого вида."""
+    if p[0] == DENSE:
+        return p[1]
+    bits = np.zeros(nwords, dtype=np.uint64)
+    ids = p[1].astype(np.uint64)
+    np.bitwise_or.at(bits, ids >> np.uint64(6), np.uint64(1) << (ids & np.uint64(63)))
+    return bits
+
+
+def _dense_contains(bits: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Маска: установлен ли в битсете бит каждого номера из ids."""
+    u = ids.astype(np.uint64)
+    words = bits[u >> np.uint64(6)]
+    return ((words >> (u & np.uint64(63))) & np.uint64(1)).astype(bool)
+
+
+def _and_dense_dense(a: np.ndarray, b: np.ndarray) -> Posting:
+    return (DENSE, a & b)
+
+
+def _and_sparse_dense(ids: np.ndarray, bits: np.ndarray) -> Posting:
+    return (SPARSE, ids[_dense_contains(bits, ids)])
+
+
+def _and_sparse_sparse(a: np.ndarray, b: np.ndarray) -> Posting:
+    return (SPARSE, np.intersect1d(a, b, assume_unique=True))
+
+
+def intersect(a: Posting, b: Posting) -> Posting:
+    if a[0] == DENSE and b[0] == DENSE:
+        return _and_dense_dense(a[1], b[1])
+    if a[0] == SPARSE and b[0] == SPARSE:
+        return _and_sparse_sparse(a[1], b[1])
+    if a[0] == SPARSE:
+        return _and_sparse_dense(a[1], b[1])
+    return _and_sparse_dense(b[1], a[1])
+
+
+def subtract(a: Posting, b: Posting) -> Posting:
+    """a AND NOT b без построения дополнения b."""
+    if a[0] == SPARSE and b[0] == SPARSE:
+        return (SPARSE, np.setdiff1d(a[1], b[1], assume_unique=True))
+    if a[0] == SPARSE:
+        return (SPARSE, a[1][~_dense_contains(b[1], a[1])])
+    return (DENSE, a[1] & ~to_dense(b, a[1].size))
+
+
+def union(postings: list[Posting], nwords: int) -> Posting:
+    if all(p[0] == SPARSE for p in postings):
+        return (SPARSE, np.unique(np.concatenate([p[1] for p in postings])))
+    bits = np.zeros(nwords, dtype=np.uint64)
+    for p in postings:
+        bits |= to_dense(p, nwords)
+    return (DENSE, bits)
+
+
+def tokenize_query(s: str) -> list[str]:
+    """
+    Разбивает строку запроса на токены: слова (термы), AND, OR, NOT, (, ).
+    Термы приводятся к нижнему регистру.
+
+    Один проход по символам без регулярных выражений: токен заканчивается
+    на пробеле или скобке, скобки идут отдельными токенами.
+    """
+    result: list[str] = []
+    i = 0
+    n = len(s)
+    while i < n:
+        c = s[i]
+        if c.isspace():
+            i += 1
+            continue
+        if c in "()":
+            result.append(c)
+            i += 1
+            continue
+        j = i
+        while j < n and not s[j].isspace() and s[j] not in "()":
+            j += 1
+        t = s[i:j]
+        upper = t.upper()
+        if upper == "AND":
+            result.append(AND_OP)
+        elif upper == "OR":
+            result.append(OR_OP)
+        elif upper == "NOT":
+            result.append(NOT_OP)
+        else:
+            result.append(sys.intern(t.lower()))
+        i = j
+    return result
+
+
+def shunting_yard(tokens: list[str]) -> list[str]:
+    """Переводит токены запроса в обратную польскую запись (алгоритм Дейкстры).
+
+    AND и OR левоассоциативны, NOT — унарный префиксный оператор: он уходит
+    в выход сразу после своего операнда (терма или скобки).
+    Некорректные запросы разбираются так же, как рекурсивным спуском:
+    пропущенный операнд — пустое множество (EMPTY_OPERAND), незакрытая скобка
+    закрывается в конце, а лишний терм, скобка или NOT там, где ожидался
+    оператор, завершают запрос — остаток игнорируется.
+
+    >>> shunting_yard(["not", "философия", "москва"])
+    ['философия', 'not']
+    >>> shunting_yard(["not", "(", "a", "or", "b", ")", "and", "c"])
+    ['a', 'b', 'or', 'not', 'c', 'and']
+    >>> shunting_yard(["a", "and"])
+    ['a', '', 'and']
+    """
+    output: list[str] = []
+    ops: list[str] = []
+    expect_operand = True
+
+    def pop_nots() -> None:
+        while ops and ops[-1] == NOT_OP:
+            output.append(ops.pop())
+
+    for t in tokens:
+        if expect_operand:
+            if t == "(" or t == NOT_OP:
+                ops.append(t)
+                continue
+            if t != AND_OP and t != OR_OP and t != ")":
+                output.append(t)
+                pop_nots()
+                expect_operand = False
+                continue
+            # Оператор или ")" вместо операнда: операнд пустой
+            output.append(EMPTY_OPERAND)
+            pop_nots()
+            expect_operand = False
+
+        if t == AND_OP or t == OR_OP:
+            prec = PRECEDENCE[t]
+            while ops and ops[-1] != "(" and PRECEDENCE[ops[-1]] >= prec:
+                output.append(ops.pop())
+            ops.append(t)
+            expect_operand = True
+        elif t == ")" and "(" in ops:
+            while ops[-1] != "(":
+                output.append(ops.pop())
+            ops.pop()
+            pop_nots()
+        else:
+            # Терм, "(" или NOT сразу после операнда либо лишняя ")"
+            break
+
+    if expect_operand:
+        output.append(EMPTY_OPERAND)
+    while ops:
+        op = ops.pop()
+        if op != "(":
+            output.append(op)
+    return output
+
+
+# Узлы дерева запроса. Сначала из RPN строится дерево, затем оно вычисляется:
+# так NOT внутри AND можно вычесть из остальных операндов, не строя дополнение,
+# а операнды цепочек AND — упорядочить по размеру.
+
+class Term:
+    def __init__(self, term: str) -> None:
+        self.term = term
+
+
+class Not:
+    def __init__(self, child: Node) -> None:
+        self.child = child
+
+
+class And:
+    def __init__(self, children: list[Node]) -> None:
+        self.children = children
+
+
+class Or:
+    def __init__(self, children: list[Node]) -> None:
+        self.children = children  # пустой Or — пустой результат
+
+
+Node = Union[Term, Not, And, Or]
+
+
+def rpn_to_tree(rpn: list[str]) -> Node:
+    """Собирает дерево запроса из RPN одним проходом со стеком.
+
+    Вложенные цепочки одного оператора сливаются: (A AND B) AND C — это
+    And([A, B, C]). EMPTY_OPERAND и недостающий операнд считаются пустым
+    множеством.
+    """
+    stack: list[Node] = []
+    for t in rpn:
+        if t == NOT_OP:
+            # NOT NOT A не сокращается до A: дополнение берётся до all_doc_ids,
+            # а термы могут встречаться и в документах вне него
+            stack.append(Not(stack.pop() if stack else Or([])))
+        elif t == AND_OP or t == OR_OP:
+            right = stack.pop() if stack else Or([])
+            left = stack.pop() if stack else Or([])
+            children: list[Node] = []
+            for node in (left, right):
+                if t == AND_OP and isinstance(node, And):
+                    children.extend(node.children)
+                elif t == OR_OP and isinstance(node, Or):
+                    children.extend(node.children)
+                else:
+                    children.append(node)
+            stack.append(And(children) if t == AND_OP else Or(children))
+        elif t == EMPTY_OPERAND:
+            stack.append(Or([]))
+        else:
+            stack.append(Term(t))
+    return stack[0] if stack else Or([])
+
+
+def evaluate(node: Node, index: PostingIndex, all_doc_ids: np.ndarray) -> Posting:
+    """Вычисляет дерево запроса, возвращает список doc_id (Posting)."""
+    if isinstance(node, Term):
+        p = index.get(node.term)
+        # Копия не нужна: операции над списками создают новые массивы
+        return EMPTY if p is None else p
+    if isinstance(node, Not):
+        # NOT на верхнем уровне или внутри OR — дополнение до всех документов
+        inner = evaluate(node.child, index, all_doc_ids)
+        return (DENSE, all_doc_ids & ~to_dense(inner, all_doc_ids.size))
+    if isinstance(node, Or):
+        if not node.children:
+            return EMPTY
+        return union([evaluate(c, index, all_doc_ids) for c in node.children], all_doc_ids.size)
+    return evaluate_and(node, index, all_doc_ids)
+
+
+def evaluate_and(node: And, index: PostingIndex, all_doc_ids: np.ndarray) -> Posting:
+    """A AND NOT B считается как A & ~B, без дополнения B до всех документов.
+
+    Документы термов не обязательно входят в all_doc_ids (index.txt может
+    знать не все страницы), поэтому при вычитании результат в конце
+    пересекается с all_doc_ids — как и у A AND (all_doc_ids - B).
+    """
+    positives = [evaluate(c, index, all_doc_ids) for c in node.children if not isinstance(c, Not)]
+    negatives = [c.child for c in node.children if isinstance(c, Not)]
+    if not positives:
+        # NOT A AND NOT B = все документы без (A OR B)
+        return evaluate(Not(Or(negatives)), index, all_doc_ids)
+
+    # Начинаем с самого редкого операнда: каждое следующее пересечение
+    # не больше него, а при пустом результате дальше считать нечего
+    positives.sort(key=posting_size)
+    result = positives[0]
+    for other in positives[1:]:
+        if is_empty(result):
+            return result
+        result = intersect(result, other)
+    for neg in negatives:
+        if is_empty(result):
+            return result
+        result = subtract(result, evaluate(neg, index, all_doc_ids))
+    if negatives:
+        result = intersect(result, (DENSE, all_doc_ids))
+    return result
+
+
+def eval_rpn(rpn: list[str], index: PostingIndex, all_doc_ids: np.ndarray) -> Posting:
+    """Вычисляет запрос в RPN, возвращает список doc_id (Posting)."""
+    return evaluate(rpn_to_tree(rpn), index, all_doc_ids)
@@ -13,35 +13,186 @@
   python boolean_search.py "(москва AND россия) OR санкт"
 """
 
+import array
 import os
-import re
 import sys
 
+import marisa_trie
+import numpy as np
+
+# Разбор и вычисление запроса вынесены в модуль, который можно собрать mypyc;
+# сам CLI остаётся на чистом Python
+from boolean_query import DENSE, EMPTY, SPARSE, eval_rpn, shunting_yard, to_dense, tokenize_query
+
 INVERTED_INDEX_FILE = "inverted_index.txt"
+# Бинарный индекс из build_inverted_index.py (формат описан там же)
+INVERTED_INDEX_TRIE = "index.marisa"  # терм -> строка битсета или ~номер массива
+DENSE_FILE = "index_dense.npy"
+SPARSE_FILE = "index_sparse.npy"
+SPARSE_OFFSETS_FILE = "index_sparse_offsets.npy"
+TRIE_RECORD_FORMAT = "<i"
 INDEX_TXT = "index.txt"  # doc_id -> URL
+UNIVERSE_FILE = "universe.txt"  # все doc_id, пишет build_inverted_index.py
+
+# Бит doc_id лежит в слове doc_id >> 6 на позиции doc_id & 63
+WORD_BITS = 64
+
+
+def doc_ids_to_bitset(doc_ids, nwords):
+    """Упаковывает номера документов в битсет из nwords слов uint64."""
+    bits = np.zeros(nwords, dtype=np.uint64)
+    ids = np.fromiter(doc_ids, dtype=np.uint64)
+    np.bitwise_or.at(bits, ids >> np.uint64(6), np.uint64(1) << (ids & np.uint64(63)))
+    return bits
+
+
+def bitset_to_doc_ids(bits):
+    """Номера документов, чьи биты установлены, по возрастанию (array('i')).
+
+    Список упакован в 4 байта на документ и копируется из буфера NumPy целиком,
+    без создания отдельного объекта int на каждый номер.
+    """
+    flags = np.unpackbits(bits.astype("<u8").view(np.uint8), bitorder="little")
+    doc_ids = array.array("i")
+    doc_ids.frombytes(np.flatnonzero(flags).astype(np.intc).tobytes())
+    return doc_ids
+
+
+def posting_to_doc_ids(posting):
+    """Номера документов списка любого вида (битсет или массив), по возрастанию."""
+    kind, data = posting
+    if kind == DENSE:
+        return bitset_to_doc_ids(data)
+    doc_ids = array.array("i")
+    doc_ids.frombytes(data.astype(np.intc).tobytes())
+    return doc_ids
+
+
+class TrieIndex:
+    """Индекс терм -> Posting поверх marisa-trie и массивов NumPy, отображённых в память.
+
+    Частые термы отдаются как (DENSE, строка матрицы битсетов), редкие — как
+    (SPARSE, срез общего массива doc_id). При загрузке ничего не разбирается.
+    """
+
+    def __init__(self, path, dense_path=DENSE_FILE, sparse_path=SPARSE_FILE,
+                 offsets_path=SPARSE_OFFSETS_FILE, nwords=0):
+        self.trie = marisa_trie.RecordTrie(TRIE_RECORD_FORMAT)
+        self.trie.mmap(path)
+        self.dense = np.load(dense_path, mmap_mode="r")
+        self.sparse = np.load(sparse_path, mmap_mode="r")
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        self.nwords = nwords
+
+    def __len__(self):
+        return len(self.trie)
+
+    def _posting(self, slot):
+        if slot >= 0:
+            bits = self.dense[slot]
+            if bits.size < self.nwords:
+                # index.txt знает документы с номерами больше, чем есть в индексе
+                bits = np.pad(bits, (0, self.nwords - bits.size))
+            return (DENSE, bits)
+        k = ~slot
+        return (SPARSE, self.sparse[self.offsets[k]:self.offsets[k + 1]])
+
+    def get(self, term, default=None):
+        records = self.trie.get(term)
+        if not records:
+            return default
+        return self._posting(records[0][0])
+
+    def values(self):
+        for _, (slot,) in self.trie.iteritems():
+            yield self._posting(slot)
+
+
+def load_trie_index(path=INVERTED_INDEX_TRIE, doc_ids=()):
+    """Открывает index.marisa. Возвращает (index, all_doc_ids), как load_inverted_index."""
+    index = TrieIndex(path)
+    doc_ids = list(doc_ids)
+    width = index.dense.shape[1] if index.dense.ndim == 2 else 1
+    if index.sparse.size:
+        width = max(width, int(index.sparse.max()) // WORD_BITS + 1)
+    nwords = max(width, max(doc_ids, default=0) // WORD_BITS + 1)
+    index.nwords = nwords
+
+    if doc_ids:
+        all_doc_ids = doc_ids_to_bitset(doc_ids, nwords)
+    else:
+        all_doc_ids = np.zeros(nwords, dtype=np.uint64)
+        for posting in index.values():
+            all_doc_ids |= to_dense(posting, nwords)
+    return index, all_doc_ids
+
 
-# Операторы в запросе (регистронезависимо)
-AND_OP = "and"
-OR_OP = "or"
-NOT_OP = "not"
+def trie_index_is_fresh(trie_path=INVERTED_INDEX_TRIE, text_path=INVERTED_INDEX_FILE):
+    """Можно ли читать бинарный индекс вместо текстового.
+
+    Бинарные файлы не хранятся в git, поэтому могут остаться от старой версии
+    формата (без .npy) или от предыдущего inverted_index.txt: берём их, только
+    если на месте все четыре файла и ни один не старше текстового индекса.
+    """
+    paths = [trie_path, DENSE_FILE, SPARSE_FILE, SPARSE_OFFSETS_FILE]
+    if not all(os.path.isfile(p) for p in paths):
+        return False
+    if not os.path.isfile(text_path):
+        return True
+    text_mtime = os.path.getmtime(text_path)
+    return all(os.path.getmtime(p) >= text_mtime for p in paths)
+
+
+def load_inverted_index(path=INVERTED_INDEX_FILE, doc_ids=(), trie_path=INVERTED_INDEX_TRIE):
+    """Загружает инвертированный индекс: терм -> Posting (см. boolean_query).
+
+    Если рядом лежит актуальный бинарный индекс (trie_index_is_fresh), он
+    читается через load_trie_index. Иначе все номера документов из текстового файла разбираются одним вызовом
+    NumPy по склеенному тексту и раскладываются по строкам общей матрицы битсетов;
+    все списки в этом случае хранятся как DENSE.
+    Возвращает (index, all_doc_ids), где all_doc_ids — битсет всех документов:
+    из doc_ids (номера из index.txt), а если их нет — объединение всего индекса.
+    """
+    if trie_path and trie_index_is_fresh(trie_path, path):
+        return load_trie_index(trie_path, doc_ids)
 
-def load_inverted_index(path=INVERTED_INDEX_FILE):
-    """Загружает инвертированный индекс: терм -> множество doc_id."""
     index = {}
     if not os.path.isfile(path):
         raise FileNotFoundError(f"Файл {path} не найден. Сначала запустите build_inverted_index.py")
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            parts = line.split()
-            if not parts:
-                continue
-            term = parts[0].lower()
-            doc_ids = set(int(x) for x in parts[1:])
-            index[term] = doc_ids
-    return index
+    with open(path, "rb") as f:
+        data = f.read()
+
+    terms = []
+    rests = []
+    counts = []
+    for line in data.splitlines():
+        # Разделитель — любые пробельные символы (как и в np.fromstring ниже),
+        # иначе число doc_id в строке разойдётся с разобранными
+        parts = line.split()
+        if not parts:
+            continue
+        # Интернированные строки-ключи сравниваются в словаре по ссылке
+        terms.append(sys.intern(parts[0].decode("utf-8").lower()))
+        rests.append(b" ".join(parts[1:]))
+        counts.append(len(parts) - 1)
+
+    all_ids = np.fromstring(b" ".join(rests), dtype=np.uint64, sep=" ")
+    doc_ids = list(doc_ids)
+    max_doc_id = max(int(all_ids.max()) if all_ids.size else 0, max(doc_ids, default=0))
+    nwords = max_doc_id // WORD_BITS + 1
+
+    rows = np.repeat(np.arange(len(terms)), counts)
+    matrix = np.zeros((len(terms), nwords), dtype=np.uint64)
+    np.bitwise_or.at(matrix, (rows, all_ids >> np.uint64(6)), np.uint64(1) << (all_ids & np.uint64(63)))
+    matrix.flags.writeable = False
+    for i, term in enumerate(terms):
+        index[term] = (DENSE, matrix[i])
+
+    if doc_ids:
+        all_doc_ids = doc_ids_to_bitset(doc_ids, nwords)
+    else:
+        all_doc_ids = np.bitwise_or.reduce(matrix, axis=0)
+    return index, all_doc_ids
 
 
 def load_doc_urls(path=INDEX_TXT):
@@ -63,112 +214,27 @@ def load_doc_urls(path=INDEX_TXT):
     return urls
 
 
-def tokenize_query(s):
-    """
-    Разбивает строку запроса на токены: слова (термы), AND, OR, NOT, (, ).
-    Термы приводятся к нижнему регистру.
-    """
-    s = s.strip()
-    if not s:
+def load_universe(path=UNIVERSE_FILE):
+    """Загружает список всех doc_id из universe.txt (пустой, если файла нет)."""
+    if not os.path.isfile(path):
         return []
-    # Разделяем по пробелам и скобкам, сохраняя скобки отдельно
-    tokens = re.findall(r'[()]|\bAND\b|\bOR\b|\bNOT\b|[^\s()]+', s, re.IGNORECASE)
-    result = []
-    for t in tokens:
-        t = t.strip()
-        if not t:
-            continue
-        upper = t.upper()
-        if upper == "AND":
-            result.append(AND_OP)
-        elif upper == "OR":
-            result.append(OR_OP)
-        elif upper == "NOT":
-            result.append(NOT_OP)
-        elif t in "()":
-            result.append(t)
-        else:
-            result.append(t.lower())
-    return result
-
-class QueryParser:
-    """Рекурсивный разбор булева выражения. Приоритет: OR < AND < NOT < терм/скобки."""
-
-    def __init__(self, tokens, index, all_doc_ids):
-        self.tokens = tokens
-        self.pos = 0
-        self.index = index
-        self.all_doc_ids = all_doc_ids
-
-    def peek(self):
-        if self.pos >= len(self.tokens):
-            return None
-        return self.tokens[self.pos]
-
-    def consume(self):
-        if self.pos < len(self.tokens):
-            self.pos += 1
-
-    def term_set(self, term):
-        """Возвращает множество doc_id для терма (леммы)."""
-        return self.index.get(term, set()).copy()
-
-    def parse_primary(self):
-        """primary = терм | ( expression ) | NOT primary"""
-        t = self.peek()
-        if t is None:
-            return set()
-        if t == "(":
-            self.consume()
-            s = self.parse_or()
-            if self.peek() == ")":
-                self.consume()
-            return s
-        if t == NOT_OP:
-            self.consume()
-            inner = self.parse_primary()
-            return self.all_doc_ids - inner
-        if t not in (AND_OP, OR_OP, ")", None):
-            term = t
-            self.consume()
-            return self.term_set(term)
-        return set()
-
-    def parse_and(self):
-        left = self.parse_primary()
-        while self.peek() == AND_OP:
-            self.consume()
-            right = self.parse_primary()
-            left = left & right
-        return left
-
-    def parse_or(self):
-        left = self.parse_and()
-        while self.peek() == OR_OP:
-            self.consume()
-            right = self.parse_and()
-            left = left | right
-        return left
-
-    def parse(self):
-        return self.parse_or()
+    with open(path, "r", encoding="utf-8") as f:
+        return [int(line) for line in f if line.strip()]
+
 
 def boolean_search(query_str, index, all_doc_ids):
-    """Выполняет булев поиск по строке запроса. Возвращает множество doc_id."""
+    """Выполняет булев поиск по строке запроса. Возвращает Posting doc_id."""
     tokens = tokenize_query(query_str)
     if not tokens:
-        return set()
-    parser = QueryParser(tokens, index, all_doc_ids)
-    return parser.parse()
+        return EMPTY
+    return eval_rpn(shunting_yard(tokens), index, all_doc_ids)
 
 def main():
-    index = load_inverted_index()
     doc_urls = load_doc_urls()
-    all_doc_ids = set(doc_urls.keys()) if doc_urls else set()
-    # Если index.txt пустой/отсутствует — все doc_id из индекса
-    if not all_doc_ids:
-        for doc_set in index.values():
-            all_doc_ids |= doc_set
+    # Если index.txt пустой/отсутствует — doc_id из universe.txt,
+    # а если нет и его — все doc_id из индекса
+    doc_ids = list(doc_urls) or load_universe()
+    index, all_doc_ids = load_inverted_index(doc_ids=doc_ids)
 
     if len(sys.argv) > 1:
         query_str = " ".join(sys.argv[1:])
@@ -186,7 +252,7 @@ def main():
         return
 
     doc_ids = boolean_search(query_str, index, all_doc_ids)
-    doc_ids_sorted = sorted(doc_ids)
+    doc_ids_sorted = posting_to_doc_ids(doc_ids)
 
     print(f"\nНайдено документов: {len(doc_ids_sorted)}")
     for doc_id in doc_ids_sorted:
@@ -9,21 +9,47 @@
 <лемма> <doc_id1> <doc_id2> ... <doc_idN>
 
 где doc_id — номер страницы (1, 2, 3, ...).
+
+Дополнительно сохраняет бинарный индекс, который boolean_search.py отображает
+в память и читает без разбора текста. Списки документов хранятся в двух видах:
+- частые термы (больше DENSE_DF_RATIO всех документов) — битсеты uint64
+  (little-endian; бит doc_id лежит в слове doc_id >> 6), строки матрицы index_dense.npy;
+- редкие термы — отсортированные массивы int32, склеенные в index_sparse.npy;
+  список номер k занимает index_sparse.npy[offsets[k]:offsets[k + 1]],
+  offsets лежат в index_sparse_offsets.npy.
+index.marisa — сжатый префиксный словарь (marisa-trie) терм -> int32:
+номер строки битсета (>= 0) или ~k для k-го редкого списка (< 0).
+
+Номера всех прочитанных документов (по одному в строке) пишутся в universe.txt.
 """
 
 import os
 import re
 import glob
 
+import marisa_trie
+import numpy as np
+
 TOKENIZED_DIR = "tokenized_pages"
 OUTPUT_FILE = "inverted_index.txt"
+TRIE_FILE = "index.marisa"
+DENSE_FILE = "index_dense.npy"
+SPARSE_FILE = "index_sparse.npy"
+SPARSE_OFFSETS_FILE = "index_sparse_offsets.npy"
+TRIE_RECORD_FORMAT = "<i"
+# Доля документов, начиная с которой список хранится битсетом
+DENSE_DF_RATIO = 0.1
+UNIVERSE_FILE = "universe.txt"
+WRITE_BUFFER_SIZE = 1 << 20
+WRITE_CHUNK_TERMS = 1000
 
 # Папки page1, page2, ... извлекаем номер
 PAGE_DIR_PATTERN = re.compile(r"page(\d+)$")
 
 
 def build_inverted_index():
-    index = {}  # lemma -> set of doc_ids
+    index = {}  # lemma -> list of doc_ids (по возрастанию)
+    seen_doc_ids = []  # все прочитанные документы, тоже по возрастанию
 
     if not os.path.isdir(TOKENIZED_DIR):
         raise FileNotFoundError(f"Папка {TOKENIZED_DIR}/ не найдена. Сначала запустите lemma_token_builder.py")
@@ -41,6 +67,7 @@ def build_inverted_index():
         lemmas_file = os.path.join(page_path, "lemmas.txt")
         if not os.path.isfile(lemmas_file):
             continue
+        seen_doc_ids.append(doc_id)
 
         with open(lemmas_file, "r", encoding="utf-8") as f:
             for line in f:
@@ -51,21 +78,65 @@ def build_inverted_index():
                 if not parts:
                     continue
                 lemma = parts[0].lower()
-                if lemma not in index:
-                    index[lemma] = set()
-                index[lemma].add(doc_id)
-
-    # Сортируем леммы и для каждой — отсортированный список doc_id
+                # Страницы обходятся по возрастанию doc_id, поэтому списки
+                # получаются уже отсортированными; повтор возможен только в конце
+                doc_ids = index.get(lemma)
+                if doc_ids is None:
+                    index[lemma] = [doc_id]
+                elif doc_ids[-1] != doc_id:
+                    doc_ids.append(doc_id)
+
+    # Сортируем леммы и пишем строки готовыми байтами пачками по
+    # WRITE_CHUNK_TERMS через буфер в 1 МБ: весь индекс в памяти не собирается
     sorted_terms = sorted(index.keys())
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as out:
+    with open(OUTPUT_FILE, "wb", buffering=WRITE_BUFFER_SIZE) as out:
+        chunk = []
         for term in sorted_terms:
-            doc_ids = sorted(index[term])
-            out.write(term + " " + " ".join(str(d) for d in doc_ids) + "\n")
+            chunk.append(f"{term} {' '.join(map(str, index[term]))}\n".encode("utf-8"))
+            if len(chunk) >= WRITE_CHUNK_TERMS:
+                out.writelines(chunk)
+                chunk.clear()
+        out.writelines(chunk)
+
+    save_tiered_index(index, sorted_terms, seen_doc_ids)
 
-    print(f"Инвертированный индекс записан в {OUTPUT_FILE}")
+    # Множество всех документов для NOT, чтобы поиск не собирал его из индекса
+    with open(UNIVERSE_FILE, "w", encoding="utf-8") as out:
+        out.writelines(f"{doc_id}\n" for doc_id in seen_doc_ids)
+
+    print(f"Инвертированный индекс записан в {OUTPUT_FILE} и {TRIE_FILE}")
+    print(f"Список документов записан в {UNIVERSE_FILE}")
     print(f"Уникальных терминов: {len(index)}")
     return index
 
 
+def save_tiered_index(index, sorted_terms, seen_doc_ids):
+    """Пишет TRIE_FILE, DENSE_FILE, SPARSE_FILE и SPARSE_OFFSETS_FILE (см. описание модуля)."""
+    max_doc_id = max(seen_doc_ids, default=0)
+    nwords = max_doc_id // 64 + 1
+    dense_threshold = DENSE_DF_RATIO * len(seen_doc_ids)
+
+    dense_terms = [t for t in sorted_terms if len(index[t]) > dense_threshold]
+    sparse_terms = [t for t in sorted_terms if len(index[t]) <= dense_threshold]
+
+    counts = [len(index[term]) for term in dense_terms]
+    ids = np.fromiter((d for term in dense_terms for d in index[term]), dtype=np.uint64, count=sum(counts))
+    rows = np.repeat(np.arange(len(dense_terms)), counts)
+    matrix = np.zeros((len(dense_terms), nwords), dtype="<u8")
+    np.bitwise_or.at(matrix, (rows, ids >> np.uint64(6)), np.uint64(1) << (ids & np.uint64(63)))
+    np.save(DENSE_FILE, matrix)
+
+    counts = [len(index[term]) for term in sparse_terms]
+    ids = np.fromiter((d for term in sparse_terms for d in index[term]), dtype="<i4", count=sum(counts))
+    np.save(SPARSE_FILE, ids)
+    np.save(SPARSE_OFFSETS_FILE, np.concatenate((np.zeros(1, dtype="<i4"), np.cumsum(counts, dtype="<i4"))))
+
+    records = [(term, (row,)) for row, term in enumerate(dense_terms)]
+    records += [(term, (~slot,)) for slot, term in enumerate(sparse_terms)]
+    trie = marisa_trie.RecordTrie(TRIE_RECORD_FORMAT, records)
+    trie.save(TRIE_FILE)
+    print(f"Частых термов (битсеты): {len(dense_terms)}, редких (массивы): {len(sparse_terms)}")
+
+
 if __name__ == "__main__":
     build_inverted_index()
@@ -4,11 +4,11 @@
 - Каждая страница сохраняется в текстовый файл вместе с HTML-разметкой.
 - Создаётся index.txt: номер файла и ссылка на страницу.
 """
+import asyncio
 import os
-import time
-import urllib.error
 import urllib.parse
-import urllib.request
+
+import aiohttp
 
 PAGES_DIR = "pages"
 URLS_FILE = "urls.txt"
@@ -19,7 +19,9 @@ REQUEST_HEADERS = {
     "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
 }
 REQUEST_TIMEOUT = 30
-DELAY_BETWEEN_REQUESTS = 0.5
+# Вместо паузы между запросами вежливость обеспечивает лимит соединений на хост
+MAX_CONNECTIONS = 16
+MAX_CONNECTIONS_PER_HOST = 2
 
 
 def load_urls(path: str) -> list[str]:
@@ -38,53 +40,90 @@ def safe_filename(index: int) -> str:
     return f"{index}.txt"
 
 
-def fetch_url(url: str) -> tuple[str, str, str] | None:
+class RequestSlots:
+    """Ограничивает число запросов, которые реально выполняются одновременно.
+
+    Таймаут сессии (ClientTimeout.total) учитывает и ожидание свободного
+    соединения в пуле, поэтому запрос не должен стартовать раньше, чем для
+    него есть слот: иначе ожидание в очереди к одному хосту съедает таймаут.
+    """
+
+    def __init__(self):
+        self.total = asyncio.Semaphore(MAX_CONNECTIONS)
+        self.per_host: dict[str, asyncio.Semaphore] = {}
+
+    def host(self, url: str) -> asyncio.Semaphore:
+        netloc = urllib.parse.urlsplit(url).netloc
+        if netloc not in self.per_host:
+            self.per_host[netloc] = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+        return self.per_host[netloc]
+
+
+async def fetch_url(session: aiohttp.ClientSession, slots: RequestSlots, url: str) -> tuple[str, str, str] | None:
     """
     Скачать URL. Возвращает (body, final_url, content_type) или None при ошибке.
+    Таймаут отсчитывается только после того, как запрос получил слот.
     """
-    req = urllib.request.Request(url, headers=REQUEST_HEADERS)
-    try:
-        with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as resp:
-            final_url = resp.geturl()
-            content_type = resp.headers.get("Content-Type", "")
-            body = resp.read().decode("utf-8", errors="replace")
-            return (body, final_url, content_type)
-    except (urllib.error.URLError, OSError) as e:
-        return None
-
-
-def run():
+    async with slots.host(url), slots.total:
+        try:
+            async with session.get(url) as resp:
+                final_url = str(resp.url)
+                content_type = resp.headers.get("Content-Type", "")
+                body = (await resp.read()).decode("utf-8", errors="replace")
+                return (body, final_url, content_type)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            return None
+
+
+async def run():
     os.makedirs(PAGES_DIR, exist_ok=True)
     urls = load_urls(URLS_FILE)
     index_entries = []
     file_index = 0
     saved = 0
 
-    for i, url in enumerate(urls, start=1):
-
-        if saved >= MIN_PAGES:
-            break
-
-        result = fetch_url(url)
-
-        if result is None:
-            print(f"[{i}] Ошибка загрузки: {url}")
-            time.sleep(DELAY_BETWEEN_REQUESTS)
-            continue
-
-        body, final_url, content_type = result
-        file_index += 1
-        path = os.path.join(PAGES_DIR, safe_filename(file_index))
-
-        # сюда по path записываем html
-        with open(path, "w", encoding="utf-8", errors="replace") as f:
-            f.write(body)
-
-        # сохраняем индекс файла и ссылку страницы
-        index_entries.append((file_index, url))
-        saved += 1
-        print(f"[{saved}] Сохранено: {file_index}.txt — {url[:60]}...")
-        time.sleep(DELAY_BETWEEN_REQUESTS)
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, limit_per_host=MAX_CONNECTIONS_PER_HOST)
+    async with aiohttp.ClientSession(
+        headers=REQUEST_HEADERS,
+        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+        connector=connector,
+        raise_for_status=True,
+        trust_env=True,  # как urllib: учитываем HTTP(S)_PROXY из окружения
+    ) as session:
+        # Загрузки идут параллельно (не больше, чем позволяют слоты), а
+        # результаты разбираем в порядке urls.txt, чтобы нумерация файлов не
+        # зависела от того, какая страница скачалась раньше
+        slots = RequestSlots()
+        tasks = [asyncio.ensure_future(fetch_url(session, slots, url)) for url in urls]
+        try:
+            for i, (url, task) in enumerate(zip(urls, tasks), start=1):
+
+                if saved >= MIN_PAGES:
+                    break
+
+                result = await task
+
+                if result is None:
+                    print(f"[{i}] Ошибка загрузки: {url}")
+                    continue
+
+                body, final_url, content_type = result
+                file_index += 1
+                path = os.path.join(PAGES_DIR, safe_filename(file_index))
+
+                # сюда по path записываем html
+                with open(path, "w", encoding="utf-8", errors="replace") as f:
+                    f.write(body)
+
+                # сохраняем индекс файла и ссылку страницы
+                index_entries.append((file_index, url))
+                saved += 1
+                print(f"[{saved}] Сохранено: {file_index}.txt — {url[:60]}...")
+        finally:
+            # Нужное число страниц набрано — остальные загрузки не нужны
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     with open(INDEX_FILE, "w", encoding="utf-8") as f:
         for num, link in index_entries:
@@ -93,4 +132,4 @@ def run():
     print(f"\nГотово. Сохранено страниц: {saved}. Index: {INDEX_FILE}, файлы в {PAGES_DIR}/")
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    asyncio.run(run())
\ No newline at end of file
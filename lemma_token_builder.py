@@ -20,58 +20,128 @@ process_pages.py
 import os
 import glob
 import re
-from html.parser import HTMLParser
+import contextlib
+import functools
+import hashlib
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 
 import pymorphy2
 import pymorphy2_dicts_ru
 
+# HTML разбирается на C: selectolax (движок lexbor), если его нет — lxml
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+    import lxml.etree
+    import lxml.html
+
 PAGES_DIR = "pages"
 OUTPUT_DIR = "tokenized_pages"
+# Хеш HTML, по которому страница была обработана в прошлый раз
+HASH_FILE = ".hash"
 
-# Только русские слова (включая ё), длина >= 2
-RE_RU_WORD = re.compile(r"[а-яё]{2,}", re.IGNORECASE)
-
+# Служебные части речи, которые не попадают в леммы
+BAD_POS = {"PREP", "CONJ", "PRCL", "INTJ"}
 
-class HTMLTextExtractor(HTMLParser):
-    """Достаём только видимый текст из HTML, игнорируем script/style."""
-    def __init__(self):
-        super().__init__()
-        self._parts = []
-        self._skip = 0  # внутри script/style
+# Кеш токен -> (лемма, часть речи) между запусками; pymorphy2 вызывается
+# только для слов, которых ещё нет в кеше
+LEMMA_CACHE_FILE = "lemma_cache.sqlite"
 
-    def handle_starttag(self, tag, attrs):
-        t = tag.lower()
-        if t in ("script", "style", "noscript"):
-            self._skip += 1
+# Анализатор создаётся лениво, при первом промахе кеша в процессе-воркере
+MORPH = None
+# Соединение с кешем и новые строки для него (см. _init и _flush_cache)
+CACHE = None
+NEW_CACHE_ROWS: list[tuple[str, str, str]] = []
 
-    def handle_endtag(self, tag):
-        t = tag.lower()
-        if t in ("script", "style", "noscript") and self._skip > 0:
-            self._skip -= 1
+# Только русские слова (включая ё) длиной от 2 до 40 букв; более длинные
+# слова отбрасываются целиком, а не режутся на куски
+RE_RU_WORD = re.compile(r"(?<![а-яё])[а-яё]{2,40}(?![а-яё])", re.IGNORECASE)
 
-    def handle_data(self, data):
-        if self._skip == 0 and data:
-            self._parts.append(data)
 
-    def get_text(self) -> str:
-        return " ".join(self._parts)
+SKIP_TAGS = ("script", "style", "noscript")
 
 
 def html_to_text(html: str) -> str:
-    parser = HTMLTextExtractor()
-    parser.feed(html)
-    return parser.get_text()
+    """Достаём только видимый текст из HTML, игнорируем script/style."""
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(html)
+        for node in tree.css(", ".join(SKIP_TAGS)):
+            node.decompose()
+        return tree.root.text(separator=" ") if tree.root else ""
+
+    try:
+        root = lxml.html.fromstring(html)
+    except lxml.etree.ParserError:
+        # Пустая строка или страница без единого узла (например, один комментарий)
+        return ""
+    for el in list(root.iter(*SKIP_TAGS)):
+        el.drop_tree()
+    return " ".join(root.itertext())
 
 
 def tokenize(text: str) -> list[str]:
-    text = text.lower()
-    tokens = RE_RU_WORD.findall(text)
+    # Приводим к нижнему регистру только найденные слова, а не всю страницу
+    return [m.group().lower() for m in RE_RU_WORD.finditer(text)]
+
+
+def _open_cache() -> sqlite3.Connection:
+    conn = sqlite3.connect(LEMMA_CACHE_FILE, timeout=60)
+    conn.execute("CREATE TABLE IF NOT EXISTS lem(tok TEXT PRIMARY KEY, lemma TEXT, pos TEXT)")
+    return conn
+
+
+def _cache() -> sqlite3.Connection:
+    """Кеш лемм открывается один раз на процесс, при первом обращении."""
+    global CACHE
+    if CACHE is None:
+        CACHE = _open_cache()
+    return CACHE
+
+
+def _init():
+    """Инициализация воркера: открываем кеш лемм один раз на процесс."""
+    _cache()
+
+
+def _morph() -> pymorphy2.MorphAnalyzer:
+    global MORPH
+    if MORPH is None:
+        MORPH = pymorphy2.MorphAnalyzer(path=pymorphy2_dicts_ru.get_path())
+    return MORPH
+
+
+@functools.lru_cache(maxsize=200_000)
+def _parse_cached(tok: str) -> tuple[str, str]:
+    """(лемма, часть речи) для токена; токены в тексте сильно повторяются.
+
+    Токены без разбора хранятся как ("", ""), чтобы не разбирать их повторно.
+    """
+    row = _cache().execute("SELECT lemma, pos FROM lem WHERE tok = ?", (tok,)).fetchone()
+    if row is not None:
+        return row
+    parses = _morph().parse(tok)
+    if parses:
+        p = parses[0]
+        lemma, pos = p.normal_form, p.tag.POS or ""
+    else:
+        lemma, pos = "", ""
+    NEW_CACHE_ROWS.append((tok, lemma, pos))
+    return lemma, pos
+
 
-    tokens = [t for t in tokens if 2 <= len(t) <= 40]
-    return tokens
+def _flush_cache() -> None:
+    """Сохраняет в кеш разобранные за страницу токены одной транзакцией."""
+    if not NEW_CACHE_ROWS:
+        return
+    cache = _cache()
+    with cache:
+        cache.executemany("INSERT OR IGNORE INTO lem VALUES (?, ?, ?)", NEW_CACHE_ROWS)
+    NEW_CACHE_ROWS.clear()
 
 
-def process_page(html: str, morph, bad_pos: set) -> tuple[list[str], dict[str, set[str]]]:
+def process_page(html: str, bad_pos: set) -> tuple[list[str], dict[str, set[str]]]:
     """Из HTML страницы извлекает токены и группу лемма->токены для этой страницы."""
     text = html_to_text(html)
     raw_tokens = tokenize(text)
@@ -79,18 +149,14 @@ def process_page(html: str, morph, bad_pos: set) -> tuple[list[str], dict[str, s
     tokens_set: set[str] = set()
     lemma_to_tokens: dict[str, set[str]] = {}
 
-    for tok in raw_tokens:
-        if any(ch.isdigit() for ch in tok):
-            continue
-        parses = morph.parse(tok)
-        if not parses:
-            continue
-        p = parses[0]
-        pos = p.tag.POS
-        lemma = p.normal_form
+    # Дальше нужны только множества, поэтому каждый токен разбираем один раз,
+    # а не на каждое его вхождение в текст
+    for tok in set(raw_tokens):
+        lemma, pos = _parse_cached(tok)
         if pos in bad_pos:
             continue
-        if not RE_RU_WORD.fullmatch(lemma) or not (2 <= len(lemma) <= 40):
+        # Нормальная форма русского токена состоит из букв: регулярка не нужна
+        if not lemma.isalpha() or not (2 <= len(lemma) <= 40):
             continue
 
         tokens_set.add(tok)
@@ -102,14 +168,48 @@ def process_page(html: str, morph, bad_pos: set) -> tuple[list[str], dict[str, s
     return tokens_list, lemma_to_tokens
 
 
+def _process_one(path: str) -> bool:
+    """Обрабатывает pages/N.txt и пишет tokenized_pages/pageN/{tokens,lemmas}.txt.
+
+    Если HTML не изменился с прошлого запуска, страница пропускается (False).
+    """
+    base = os.path.splitext(os.path.basename(path))[0]
+    page_dir = os.path.join(OUTPUT_DIR, f"page{base}")
+    os.makedirs(page_dir, exist_ok=True)
+
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        html = f.read()
+
+    digest = hashlib.blake2b(html.encode("utf-8", "replace"), digest_size=16).hexdigest()
+    hash_path = os.path.join(page_dir, HASH_FILE)
+    outputs = [os.path.join(page_dir, name) for name in ("tokens.txt", "lemmas.txt")]
+    if os.path.isfile(hash_path) and all(os.path.isfile(p) for p in outputs):
+        with open(hash_path, "r", encoding="ascii") as f:
+            if f.read().strip() == digest:
+                return False
+
+    tokens_list, lemma_to_tokens = process_page(html, BAD_POS)
+    _flush_cache()
+
+    with open(os.path.join(page_dir, "tokens.txt"), "w", encoding="utf-8") as f:
+        for t in tokens_list:
+            f.write(t + "\n")
+
+    with open(os.path.join(page_dir, "lemmas.txt"), "w", encoding="utf-8") as f:
+        for lemma in sorted(lemma_to_tokens.keys()):
+            toks = sorted(lemma_to_tokens[lemma])
+            f.write(lemma + " " + " ".join(toks) + "\n")
+
+    # Хеш пишем последним: прерванная обработка не будет считаться готовой
+    with open(hash_path, "w", encoding="ascii") as f:
+        f.write(digest + "\n")
+    return True
+
+
 def main():
     if not os.path.isdir(PAGES_DIR):
         raise FileNotFoundError(f"Нет папки {PAGES_DIR}/ (сначала запустите краулер)")
 
-    dict_path = pymorphy2_dicts_ru.get_path()
-    morph = pymorphy2.MorphAnalyzer(path=dict_path)
-    bad_pos = {"PREP", "CONJ", "PRCL", "INTJ"}
-
     def page_number(path):
         name = os.path.splitext(os.path.basename(path))[0]
         try:
@@ -121,27 +221,19 @@ def main():
     if not files:
         raise FileNotFoundError(f"В {PAGES_DIR}/ нет *.txt файлов")
 
-    for path in files:
-        base = os.path.splitext(os.path.basename(path))[0]
-        page_dir = os.path.join(OUTPUT_DIR, f"page{base}")
-        os.makedirs(page_dir, exist_ok=True)
-
-        with open(path, "r", encoding="utf-8", errors="replace") as f:
-            html = f.read()
-
-        tokens_list, lemma_to_tokens = process_page(html, morph, bad_pos)
-
-        with open(os.path.join(page_dir, "tokens.txt"), "w", encoding="utf-8") as f:
-            for t in tokens_list:
-                f.write(t + "\n")
+    # Таблицу и WAL-режим настраиваем до запуска воркеров, чтобы они
+    # могли параллельно читать кеш, пока один из них пишет
+    with contextlib.closing(_open_cache()) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
 
-        with open(os.path.join(page_dir, "lemmas.txt"), "w", encoding="utf-8") as f:
-            for lemma in sorted(lemma_to_tokens.keys()):
-                toks = sorted(lemma_to_tokens[lemma])
-                f.write(lemma + " " + " ".join(toks) + "\n")
+    # Страницы независимы: каждый воркер сам пишет tokens.txt/lemmas.txt,
+    # поэтому результаты через pickle не передаются
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init) as executor:
+        processed = sum(executor.map(_process_one, files, chunksize=4))
 
     print("Готово!")
-    print(f"- Обработано страниц: {len(files)}")
+    print(f"- Обработано страниц: {processed}")
+    print(f"- Без изменений (пропущено): {len(files) - processed}")
 
 if __name__ == "__main__":
     main()